@@ -1,53 +1,115 @@
-import os, json, smtplib, argparse, ssl, sys, urllib.parse
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime, time as dtime
+import os, io, re, json, time, functools, smtplib, argparse, ssl, sys, asyncio
+from email.message import EmailMessage
+from datetime import datetime
 from zoneinfo import ZoneInfo
 from pathlib import Path
 
 # ------------ config ------------
 TZ = ZoneInfo("America/Los_Angeles")
 UBER_URL = "https://www.uber.com/us/en/careers/list/?department=University"
-SEEN_UBER = Path("seen_uber.json")
+UBER_API = "https://www.uber.com/api/loadMoreJobs"
+UBER_API_MAX_PAGES = 20
+UBER_JOB_SELECTOR = "a[href*='/careers/list/']"
+SEEN_UBER = Path("seen_uber.txt")
+SEEN_META = Path("seen_meta.json")  # per-page ETag / Last-Modified of the API
+UBER_STATE = Path("uber_state.json")  # Playwright storage_state from the last scrape
 
 UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
       "AppleWebKit/537.36 (KHTML, like Gecko) "
       "Chrome/124.0 Safari/537.36")
 
+# title must mention 2026 and look like a SWE / new-grad role
+_RE_SWE = re.compile(r"software engineer|\bswe\b|graduate", re.IGNORECASE)
+
 # ------------ helpers ------------
-def in_allowed_window(now_pt: datetime) -> bool:
-    return dtime(5, 0) <= now_pt.time() <= dtime(23, 0)  # 5:00–23:00 PT
+_SESSION = None
+
+def _session():
+    """One pooled, keep-alive session for every HTTP call. Built on first
+    use so --test-email and outside-window runs never import requests."""
+    global _SESSION
+    if _SESSION is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        _SESSION = requests.Session()
+        _SESSION.headers.update({"User-Agent": UA})
+        _SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10,
+                                               max_retries=Retry(total=3, backoff_factor=0.3)))
+    return _SESSION
+
+_SSL_CTX = None
+
+def _ssl_context() -> ssl.SSLContext:
+    """Build the default context (and parse the CA bundle) once per process."""
+    global _SSL_CTX
+    if _SSL_CTX is None:
+        _SSL_CTX = ssl.create_default_context()
+    return _SSL_CTX
+
+_PT_OFFSET = None  # (valid_until, seconds east of UTC)
+
+def _pt_offset(now: float) -> float:
+    """PT's UTC offset, looked up in the tz database at most once an hour."""
+    global _PT_OFFSET
+    if _PT_OFFSET is None or now >= _PT_OFFSET[0]:
+        offset = datetime.fromtimestamp(now, TZ).utcoffset().total_seconds()
+        _PT_OFFSET = (now + 3600, offset)
+    return _PT_OFFSET[1]
+
+def in_allowed_window(now: float | None = None) -> bool:
+    now = time.time() if now is None else now
+    pt_seconds = (now + _pt_offset(now)) % 86400
+    return 5 * 3600 <= pt_seconds <= 23 * 3600  # 5:00–23:00 PT
 
 def normalize_url(url: str) -> str:
     """Drop query + fragment so the same job doesn’t appear twice."""
-    try:
-        parsed = urllib.parse.urlparse(url)
-        return urllib.parse.urlunparse(parsed._replace(query="", fragment=""))
-    except Exception:
-        return url.strip()
+    return url.strip().partition("#")[0].partition("?")[0]
 
 def load_seen(path: Path):
+    """Seen URLs are stored one per line, appended as they are emailed."""
     if path.exists():
         try:
-            return set(json.loads(path.read_text()))
+            return set(filter(None, path.read_text().splitlines()))
         except Exception:
             return set()
     return set()
 
-def save_seen(path: Path, seen_set):
+def append_seen(path: Path, new_urls):
+    if not new_urls:
+        return
+    try:
+        with path.open("a") as f:
+            f.write("\n".join(new_urls) + "\n")
+    except Exception as e:
+        print(f"Warn: failed to save {path.name}: {e}", file=sys.stderr)
+
+def load_meta(path: Path) -> dict:
     try:
-        path.write_text(json.dumps(sorted(seen_set)))
+        return json.loads(path.read_text()) if path.exists() else {}
+    except Exception:
+        return {}
+
+def save_meta(path: Path, meta: dict):
+    if not meta or meta == load_meta(path):
+        return
+    try:
+        path.write_text(json.dumps(meta, sort_keys=True))
     except Exception as e:
         print(f"Warn: failed to save {path.name}: {e}", file=sys.stderr)
 
+@functools.lru_cache(maxsize=4096)
 def matches_target(title: str) -> bool:
-    t = title.lower()
-    has_2026 = "2026" in t
-    has_sweish = ("software engineer" in t) or ("software engineering" in t) or (" swe " in f" {t} ")
-    has_graduate = "graduate" in t
-    return has_2026 and (has_sweish or has_graduate)
+    if "2026" not in title:  # most titles; skip the regex
+        return False
+    return _RE_SWE.search(title) is not None
 
 def send_email(subject: str, body: str):
+    send_emails([(subject, body)])
+
+def send_emails(messages: list[tuple[str, str]]):
+    """Send each (subject, body), sharing one SMTP login per batch of
+    SMTP_MAX_MSGS_PER_CONN (default 100) messages."""
     smtp_host = os.getenv("SMTP_HOST", "smtp.gmail.com")
     smtp_port = int(os.getenv("SMTP_PORT") or "465")
     smtp_user = os.getenv("SMTP_USER")
@@ -56,65 +118,205 @@ def send_email(subject: str, body: str):
 
     if not (smtp_user and smtp_pass and to_email):
         raise RuntimeError("Missing SMTP_USER / SMTP_PASS / TO_EMAIL env vars.")
+    if not messages:
+        return
 
-    msg = MIMEMultipart()
-    msg["From"] = smtp_user
-    msg["To"] = to_email
-    msg["Subject"] = subject
-    msg.attach(MIMEText(body, "plain"))
-
-    with smtplib.SMTP_SSL(smtp_host, smtp_port, context=ssl.create_default_context()) as server:
-        server.login(smtp_user, smtp_pass)
-        server.sendmail(smtp_user, [to_email], msg.as_string())
+    # reconnect every N messages so long batches don't hit server caps
+    per_conn = max(1, int(os.getenv("SMTP_MAX_MSGS_PER_CONN") or "100"))
+    for i in range(0, len(messages), per_conn):
+        with smtplib.SMTP_SSL(smtp_host, smtp_port, context=_ssl_context()) as server:
+            server.login(smtp_user, smtp_pass)
+            for subject, body in messages[i:i + per_conn]:
+                msg = EmailMessage()
+                msg["From"] = smtp_user
+                msg["To"] = to_email
+                msg["Subject"] = subject
+                msg.set_content(body)
+                server.send_message(msg)
 
 # ------------ scraping (Uber) ------------
-def fetch_uber_with_playwright() -> list[dict]:
-    from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        ctx = browser.new_context(user_agent=UA)
-        page = ctx.new_page()
-        page.goto(UBER_URL, wait_until="domcontentloaded", timeout=60_000)
-
-        # wait for listings
-        try:
-            page.wait_for_selector("a[href*='/careers/list/']", timeout=10_000)
-        except PWTimeout:
-            return []
-
-        # scroll / load more
-        for _ in range(16):
-            before = page.locator("a[href*='/careers/list/']").count()
-            page.keyboard.press("End")
-            page.wait_for_timeout(500)
-            load_more = page.locator("button:has-text('Load more')")
-            if load_more.count() > 0:
-                try:
-                    load_more.first.click(timeout=2000)
-                    page.wait_for_timeout(900)
-                except Exception:
-                    pass
-            after = page.locator("a[href*='/careers/list/']").count()
-            if after <= before:
+def _api_page(pg: int, cond: dict | None = None):
+    return _session().get(UBER_API, params={"department": "University", "page": str(pg)},
+                          headers=cond or None, timeout=(3, 10))
+
+def _validators(r) -> dict:
+    return {k: v for k, v in (("etag", r.headers.get("ETag")),
+                              ("last_modified", r.headers.get("Last-Modified"))) if v}
+
+def _conditional_headers(v: dict) -> dict:
+    cond = {}
+    if v.get("etag"):
+        cond["If-None-Match"] = v["etag"]
+    if v.get("last_modified"):
+        cond["If-Modified-Since"] = v["last_modified"]
+    return cond
+
+def fetch_uber_api(meta: dict | None = None) -> tuple[list[dict] | None, dict]:
+    """Page through Uber's JSON endpoint. Returns (jobs, meta).
+
+    Each page the last run read is a conditional GET against that page's
+    ETag / Last-Modified in `meta`; jobs is None only when *every* one of
+    them answers 304. On any failure jobs is [] so the caller can fall back
+    to the browser scrape."""
+    prev = (meta or {}).get("pages") or []
+    batches, page_meta = [], []
+    try:
+        for pg in range(1, UBER_API_MAX_PAGES + 1):
+            cond = _conditional_headers(prev[pg - 1]) if pg <= len(prev) else {}
+            r = _api_page(pg, cond)
+            if cond and r.status_code == 304:
+                batches.append(None)  # unchanged; body re-read below if needed
+                page_meta.append(prev[pg - 1])
+                if pg == len(prev):
+                    break  # the last run stopped on this page too
+                continue
+            r.raise_for_status()
+            batch = r.json().get("jobs") or []
+            batches.append(batch)
+            page_meta.append(_validators(r))
+            if not batch:
                 break
+        if prev and len(batches) == len(prev) and all(b is None for b in batches):
+            return None, meta
+        # something changed: 304 pages still hold jobs we need, so read them in full
+        for i, b in enumerate(batches):
+            if b is None:
+                r = _api_page(i + 1)
+                r.raise_for_status()
+                batches[i] = r.json().get("jobs") or []
+    except Exception as e:
+        print(f"Warn: Uber API failed: {e}", file=sys.stderr)
+        return [], {}
 
-        anchors = page.locator("a[href*='/careers/list/']").all()
-        jobs, seen_urls = [], set()
-        for a in anchors:
-            href = a.get_attribute("href") or ""
-            title = (a.inner_text() or "").strip()
-            if not title or "/careers/list/" not in href:
+    jobs, seen_urls = [], set()
+    for batch in batches:
+        for job in batch:
+            title = (job.get("title") or "").strip()
+            # same /careers/list/<id> form the scrape and seen_uber.txt use
+            if job.get("id"):
+                href = f"https://www.uber.com/careers/list/{job['id']}"
+            else:
+                href = job.get("absolute_url") or ""
+            if not title or not href:
                 continue
-            if href.startswith("/"):
-                href = "https://www.uber.com" + href
             href = normalize_url(href)
             if href in seen_urls:
                 continue
             seen_urls.add(href)
             jobs.append({"title": title, "url": href})
+    # validators only mean something if the API is what we actually read,
+    # and a page without them could never 304, so don't bother storing any
+    if not jobs or not all(page_meta):
+        return jobs, {}
+    return jobs, {"pages": page_meta}
+
+async def _open_browser(p):
+    """Attach to a warm Chromium if CHROMIUM_CDP_URL is set, else launch one."""
+    cdp_url = os.getenv("CHROMIUM_CDP_URL")
+    if cdp_url:
+        try:
+            return await p.chromium.connect_over_cdp(cdp_url)
+        except Exception as e:
+            print(f"Warn: CDP connect to {cdp_url} failed ({e}); launching.", file=sys.stderr)
+    return await p.chromium.launch(headless=True)
+
+# job titles live in the DOM; none of these are needed to read them
+BLOCKED_RESOURCE_TYPES = {"image", "font", "stylesheet", "media"}
+BLOCKED_HOSTS = ("google-analytics", "googletagmanager", "doubleclick",
+                 "segment.io", "optimizely")
+
+async def _block_heavy(route):
+    req = route.request
+    if req.resource_type in BLOCKED_RESOURCE_TYPES or any(h in req.url for h in BLOCKED_HOSTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+# Scroll and click "Load more" until a round adds no job links. Each round
+# resolves as soon as a MutationObserver sees new links, or after settleMs.
+_LOAD_ALL_JS = """async ([sel, maxRounds, settleMs]) => {
+    const count = () => document.querySelectorAll(sel).length;
+    const grew = (n) => new Promise(resolve => {
+        if (count() > n) return resolve(true);
+        const obs = new MutationObserver(() => {
+            if (count() > n) { obs.disconnect(); clearTimeout(timer); resolve(true); }
+        });
+        const timer = setTimeout(() => { obs.disconnect(); resolve(false); }, settleMs);
+        obs.observe(document.body, {childList: true, subtree: true});
+    });
+    for (let i = 0; i < maxRounds; i++) {
+        const before = count();
+        window.scrollTo(0, document.body.scrollHeight);
+        const btn = [...document.querySelectorAll('button')]
+            .find(b => b.textContent.includes('Load more'));
+        if (btn) btn.click();
+        if (!(await grew(before))) break;
+    }
+}"""
+
+async def fetch_uber_with_playwright() -> list[dict]:
+    from playwright.async_api import async_playwright
+    async with async_playwright() as p:
+        browser = await _open_browser(p)
+        try:
+            # contexts are cheap, browsers are not: one context per scrape,
+            # always closed so a shared CDP browser doesn't accumulate them
+            ctx = await _new_context(browser)
+            try:
+                jobs = await _scrape_uber_listing(ctx)
+                if jobs:
+                    try:
+                        await ctx.storage_state(path=UBER_STATE)
+                    except Exception as e:
+                        print(f"Warn: failed to save {UBER_STATE.name}: {e}", file=sys.stderr)
+                return jobs
+            finally:
+                await ctx.close()
+        finally:
+            await browser.close()
+
+async def _new_context(browser):
+    """New context, warmed with the previous run's cookies/storage if present."""
+    if UBER_STATE.exists():
+        try:
+            return await browser.new_context(user_agent=UA, storage_state=UBER_STATE)
+        except Exception as e:
+            print(f"Warn: ignoring {UBER_STATE.name}: {e}", file=sys.stderr)
+    return await browser.new_context(user_agent=UA)
+
+async def _scrape_uber_listing(ctx) -> list[dict]:
+    from playwright.async_api import TimeoutError as PWTimeout
+    page = await ctx.new_page()
+    await page.route("**/*", _block_heavy)
+    await page.goto(UBER_URL, wait_until="domcontentloaded", timeout=60_000)
+
+    # wait for listings
+    try:
+        await page.wait_for_selector(UBER_JOB_SELECTOR, state="attached", timeout=10_000)
+    except PWTimeout:
+        return []
+
+    # scroll / load more entirely in-page: one IPC instead of several per round
+    await page.evaluate(_LOAD_ALL_JS, [UBER_JOB_SELECTOR, 16, 2000])
 
-        browser.close()
-        return jobs
+    # one round-trip for every anchor's href + text
+    rows = await page.eval_on_selector_all(
+        UBER_JOB_SELECTOR,
+        "els => els.map(a => ({href: a.getAttribute('href') || '', title: (a.innerText || '').trim()}))",
+    )
+    jobs, seen_urls = [], set()
+    for row in rows:
+        href, title = row["href"], row["title"]
+        if not title or "/careers/list/" not in href:
+            continue
+        if href.startswith("/"):
+            href = "https://www.uber.com" + href
+        href = normalize_url(href)
+        if href in seen_urls:
+            continue
+        seen_urls.add(href)
+        jobs.append({"title": title, "url": href})
+    return jobs
 
 # ------------ main ------------
 def main():
@@ -122,6 +324,8 @@ def main():
     parser.add_argument("--test-email", action="store_true")
     parser.add_argument("--ignore-window", action="store_true")
     parser.add_argument("--send-all-now", action="store_true")
+    parser.add_argument("--source", choices=("auto", "api", "playwright"), default="auto",
+                        help="auto: JSON API, Playwright if it returns nothing")
     args = parser.parse_args()
 
     if args.test_email:
@@ -129,17 +333,27 @@ def main():
         print("Test email sent.")
         return
 
-    now_pt = datetime.now(TZ)
-    if not args.ignore_window and not in_allowed_window(now_pt):
-        print(f"Outside window (PT): {now_pt}. Skipping.")
+    if not args.ignore_window and not in_allowed_window():
+        print(f"Outside window (PT): {datetime.now(TZ)}. Skipping.")
         return
 
-    # scrape + filter
-    uber_jobs = fetch_uber_with_playwright()
+    # scrape + filter; API pages are conditional GETs (not for
+    # --send-all-now, which always wants the full list)
+    uber_jobs, validators = [], {}
+    if args.source != "playwright":
+        meta = {} if args.send_all_now else load_meta(SEEN_META)
+        uber_jobs, validators = fetch_uber_api(meta)
+        if uber_jobs is None:
+            print("[Uber] job list unchanged since last run (304). Skipping.")
+            return
+    if not uber_jobs and args.source != "api":
+        if args.source == "auto":
+            print("[Uber] API returned nothing; falling back to Playwright.")
+        uber_jobs = asyncio.run(fetch_uber_with_playwright())
     print(f"[Uber] fetched {len(uber_jobs)} jobs.")
     uber_matches = [j for j in uber_jobs if matches_target(j["title"])]
 
-    # dedupe with seen.json
+    # dedupe with seen file
     seen_uber = load_seen(SEEN_UBER)
     if args.send_all_now:
         send_uber = uber_matches
@@ -148,21 +362,25 @@ def main():
 
     if not send_uber:
         print("No new matches this run.")
+        if uber_jobs:  # don't pin validators to a run whose fetch failed
+            save_meta(SEEN_META, validators)
         return
 
     # email body
-    lines = ["Uber Jobs:"]
-    lines.extend([f"- {j['title']}\n  {j['url']}" for j in send_uber])
-    body = "\n".join(lines).rstrip()
+    buf = io.StringIO()
+    buf.write("Uber Jobs:\n")
+    buf.writelines(f"- {j['title']}\n  {j['url']}\n" for j in send_uber)
+    body = buf.getvalue().rstrip()
 
     subject = f"[Job Watch] {len(send_uber)} new Uber match(es)"
     send_email(subject, body)
     print(f"Emailed {len(send_uber)} Uber new match(es).")
 
-    # persist seen
-    for j in send_uber:
-        seen_uber.add(j["url"])
-    save_seen(SEEN_UBER, seen_uber)
+    # persist seen (append only the URLs not already on file)
+    new_uber_urls = [j["url"] for j in send_uber if j["url"] not in seen_uber]
+    append_seen(SEEN_UBER, new_uber_urls)
+    # only after the email went out, so a failed send is retried next run
+    save_meta(SEEN_META, validators)
 
 if __name__ == "__main__":
     main()